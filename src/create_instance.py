@@ -1,9 +1,11 @@
 import argparse
+import dataclasses
+import functools
 import os
 import sys
-
-import boto3
-from botocore import exceptions
+import uuid
+from concurrent import futures
+from typing import List, Optional
 
 """
 Module contains classes and __main__ method to support creating an instance in
@@ -22,6 +24,15 @@ class KeyExistsError(Exception):
     pass
 
 
+class KeyNameInvalidError(Exception):
+    """
+    Raised when a Key Pair name cannot be used as a file name in the users .ssh
+    folder.
+    """
+
+    pass
+
+
 class ImageMissingError(Exception):
     """
     Raised when an AMI is not located on AWS according to the filters.
@@ -49,9 +60,10 @@ class KeyPair(object):
         :param str key_name: Name of the key pair and the local key.  Local key
         is appended with ".pem".
         :param botocore_client.EC2 client: boto client connecting to EC2.
-        :param os operating_system: Operating System object that has path and
-        chown functions.
+        :param os operating_system: Operating System object that has path, open
+        and fchmod functions.
         :param open open_strategy: Callable used to open files for writing.
+        Must accept an opener the same way the builtin open does.
         """
 
         self._key_name = key_name
@@ -73,19 +85,47 @@ class KeyPair(object):
     def _assemble_local_path(self):
         ssh_directory_path = self._operating_system.path.expanduser('~/.ssh')
         key_file_name = "{key_name}.pem".format(key_name=self._key_name)
-        local_path = self._operating_system.path.sep.join(
-            [ssh_directory_path, key_file_name]
+        local_path = self._operating_system.path.join(
+            ssh_directory_path,
+            key_file_name
         )
 
         return local_path
 
+    def _check_key_name(self):
+        # EC2 allows separators in key names, but joining such a name onto the
+        # .ssh folder would write the private key material somewhere else.
+        path = self._operating_system.path
+        separators = [path.sep, path.altsep]
+
+        if any(separator and separator in self._key_name
+               for separator in separators):
+            error_template = "Key name {key_name} contains a path separator."
+            raise KeyNameInvalidError(
+                error_template.format(key_name=self._key_name)
+            )
+
+    def _open_private_file(self, path, flags):
+        # The mode given to open only applies when the file is newly created,
+        # so an existing key file is also restricted through its descriptor
+        # before any key material is written to it.
+        file_descriptor = self._operating_system.open(path, flags, 0o600)
+        self._operating_system.fchmod(file_descriptor, 0o600)
+
+        return file_descriptor
+
     def _write_material_to_file(self, key_material):
         local_path = self._assemble_local_path()
 
-        with self._open_strategy(local_path, mode='w') as key_file:
-            key_file.write(key_material)
-
-        self._operating_system.chmod(local_path, 0o600)
+        # The material is plain ASCII, so it is written as bytes in one buffered
+        # call rather than going through a text wrapper.
+        with self._open_strategy(
+                local_path,
+                mode='wb',
+                buffering=8192,
+                opener=self._open_private_file
+        ) as key_file:
+            key_file.write(key_material.encode('ascii'))
 
     def create_in_all_locations(self):
         """
@@ -94,6 +134,8 @@ class KeyPair(object):
 
         :return:
         """
+        self._check_key_name()
+
         try:
             create_response = self._client.create_key_pair(
                 KeyName=self._key_name,
@@ -102,9 +144,10 @@ class KeyPair(object):
             key_material = create_response['KeyMaterial']
             self._write_material_to_file(key_material=key_material)
 
-        except exceptions.ClientError as client_error:
+        except self._client.exceptions.ClientError as client_error:
+            error_code = client_error.response['Error']['Code']
 
-            if 'InvalidKeyPair.Duplicate' in str(client_error):
+            if error_code == 'InvalidKeyPair.Duplicate':
                 raise KeyExistsError(str(client_error))
 
             else:
@@ -115,7 +158,7 @@ class AmazonMachineImage(object):
     """
     Class that represents an Amazon Machine Image (AMI) on AWS.  Handles mapping
     image name to id and adding its id to a specification.  Assumes image is
-    present on AWS.
+    present on AWS.  The id is looked up once and reused afterwards.
     """
 
     # noinspection PyUnresolvedReferences
@@ -136,6 +179,9 @@ class AmazonMachineImage(object):
         self._client = client
         self._name = name
         self._is_public = is_public
+        self._image_id = None
+        self._filters = self._assemble_filters()
+        self._owners = self._assemble_owners()
 
     def _assemble_filters(self):
         name_filter = {"Name": "name", "Values": [self._name]}
@@ -147,19 +193,46 @@ class AmazonMachineImage(object):
 
         return filters
 
+    def _assemble_owners(self):
+        if self._is_public:
+            owners = ['amazon', 'self']
+
+        else:
+            owners = ['self']
+
+        return owners
+
     def _lookup_image_id(self):
-        filters = self._assemble_filters()
-        response = self._client.describe_images(Filters=filters)
+        if self._image_id:
+            return self._image_id
+
+        paginator = self._client.get_paginator('describe_images')
+        pages = paginator.paginate(
+            Filters=self._filters,
+            Owners=self._owners,
+            PaginationConfig={'PageSize': 100}
+        )
 
-        try:
-            image_id = response['Images'][0]['ImageId']
+        for page in pages:
+            for image in page['Images']:
+                self._image_id = image['ImageId']
 
-            return image_id
+                return self._image_id
 
-        except IndexError:
-            message = "{image} not found.".format(image=str(self))
+        message = "{image} not found.".format(image=str(self))
 
-            raise ImageMissingError(message)
+        raise ImageMissingError(message)
+
+    def resolve_image_id(self):
+        """
+        Looks up the image id on AWS and keeps it for later specifications.
+        Safe to call ahead of time so the lookup overlaps with other work.
+
+        :return str: The id of the image.
+        """
+        image_id = self._lookup_image_id()
+
+        return image_id
 
     def add_image_id_to_specification(self, specification):
         """
@@ -182,13 +255,34 @@ class AmazonMachineImage(object):
 
 class InstanceBuilder(object):
     """
-    Class used to build AWS EC2 instance specifications and then create that
-    instance.  Tags are hardcoded.  Supports installing packages with user data
-    and cloud-init.  By default the key pair and subnet id are not specified.
+    Class used to build AWS EC2 instance specifications and then create those
+    instances.  Tags are hardcoded.  Supports installing packages with user data
+    and cloud-init; no user data is sent when there are no packages to install.
+    By default the key pair and subnet id are not specified.
     All required values are passed in through the constructor.  All optional
     values can be specified through their respective methods.
     """
 
+    # Poll every 3 seconds for up to 3 minutes rather than the waiter's default
+    # of every 15 seconds for up to 10 minutes.
+    _WAITER_CONFIG = {'Delay': 3, 'MaxAttempts': 60}
+
+    _TAG_SPECIFICATIONS = (
+        {
+            'ResourceType': 'instance',
+            'Tags': (
+                {
+                    'Key': 'Project',
+                    'Value': 'Jobcase-Test-Lab'
+                },
+                {
+                    'Key': 'Environment',
+                    'Value': 'Development'
+                }
+            )
+        },
+    )
+
     # noinspection PyUnresolvedReferences
     def __init__(self, client, machine_image, instance_type):
         """
@@ -206,6 +300,7 @@ class InstanceBuilder(object):
         self._subnet_id = None
         self._instance_type = instance_type
         self._packages_to_install = []
+        self._instance_count = 1
 
     def specify_key_pair(self, key_pair):
         """
@@ -241,55 +336,51 @@ class InstanceBuilder(object):
 
         self._packages_to_install = packages
 
-    def _assemble_user_data(self):
-        user_data_lines = ["#cloud-config", ""]
+    def specify_instance_count(self, count):
+        """
+        Specify how many identical instances to create.  All of them are
+        launched with a single request.
 
-        if self._packages_to_install:
-            user_data_lines.append("packages:")
+        :param int count: The number of instances to be created.
+        :return:
+        """
 
-            for single_package in self._packages_to_install:
-                line_template = " - {package}"
-                package_line = line_template.format(package=single_package)
-                user_data_lines.append(package_line)
+        self._instance_count = count
 
-        joined_user_data = "\n".join(user_data_lines)
+    def _assemble_user_data(self):
+        user_data = "#cloud-config\n"
 
-        return joined_user_data
+        if self._packages_to_install:
+            package_lines = "\n".join(
+                " - {package}".format(package=single_package)
+                for single_package in self._packages_to_install
+            )
+            packages_template = "{user_data}\npackages:\n{package_lines}"
+            user_data = packages_template.format(
+                user_data=user_data,
+                package_lines=package_lines
+            )
 
-    @staticmethod
-    def _assemble_tags():
-        tags = [
-            {
-                'Key': 'Project',
-                'Value': 'Jobcase-Test-Lab'
-            },
-            {
-                'Key': 'Environment',
-                'Value': 'Development'
-            }
-        ]
+        return user_data
 
-        instance_tag_specification = {'ResourceType': 'instance', 'Tags': tags}
-        tag_specifications = [instance_tag_specification]
+    @classmethod
+    def _assemble_tags(cls):
+        tag_specifications = list(cls._TAG_SPECIFICATIONS)
 
         return tag_specifications
 
-    def create_instance(self):
-        """
-        Create the EC2 instance on AWS as specified.  Waits until the instance
-        is running and then returns.
-
-        :return:
-        """
-
+    def _launch(self, count):
         instance_specification = {
             "InstanceType": self._instance_type,
-            "UserData": self._assemble_user_data(),
             "TagSpecifications": self._assemble_tags(),
-            "MaxCount": 1,
-            "MinCount": 1
+            "MaxCount": count,
+            "MinCount": count,
+            "ClientToken": uuid.uuid4().hex
         }
 
+        if self._packages_to_install:
+            instance_specification['UserData'] = self._assemble_user_data()
+
         if self._key_pair:
             self._key_pair.add_key_name_to_specification(
                 specification=instance_specification
@@ -303,14 +394,65 @@ class InstanceBuilder(object):
         )
 
         response = self._client.run_instances(**instance_specification)
-        instance_id = response['Instances'][0]['InstanceId']
+        instance_ids = [
+            single_instance['InstanceId']
+            for single_instance in response['Instances']
+        ]
 
         waiter = self._client.get_waiter('instance_running')
-        waiter.wait(InstanceIds=[instance_id])
+        waiter.wait(
+            InstanceIds=instance_ids,
+            WaiterConfig=self._WAITER_CONFIG
+        )
+
+        return instance_ids
+
+    def create_instances(self):
+        """
+        Create the EC2 instances on AWS as specified.  Waits until every
+        instance is running and then returns.  Each call carries a fresh
+        client token, so botocore retries of the same launch do not start more
+        instances while later calls still launch new ones.
+
+        :return List[str]: The ids of the created instances.
+        """
+
+        instance_ids = self._launch(count=self._instance_count)
+
+        return instance_ids
+
+    def create_instance(self):
+        """
+        Create a single EC2 instance on AWS as specified, regardless of the
+        specified instance count.  Waits until the instance is running and
+        then returns.
+
+        :return str: The id of the created instance.
+        """
+
+        instance_id, = self._launch(count=1)
 
         return instance_id
 
 
+@dataclasses.dataclass(frozen=True)
+class ScriptArguments(object):
+    """
+    Class that holds the parsed command line arguments of CreateInstanceScript
+    with typed attribute access.  Field names match the argument destinations.
+    """
+
+    key_name: str
+    image_is_public: bool
+    image_name: str
+    prebaked: bool
+    packages: List[str]
+    instance_type: str
+    count: int
+    region_name: str
+    subnet_id: Optional[str]
+
+
 class CreateInstanceScript(object):
     """
     Class that represents the scripting to create an AWS EC2 Instance.  Handles
@@ -322,6 +464,11 @@ class CreateInstanceScript(object):
         "https://boto3.readthedocs.io/en/latest/guide/configuration.html"
     )
 
+    # Clients are shared across runs so repeated invocations in the same
+    # process skip credential resolution and connection setup.  They are keyed
+    # by the injected AWS library as well, so each library gets its own client.
+    _CLIENT_CACHE = {}
+
     def __init__(
             self,
             args,
@@ -337,7 +484,7 @@ class CreateInstanceScript(object):
         :param exit exit_strategy: The callable used to exit out of the program.
         Should default return an error code.
         :param os operating_system: The object representing the operating
-        system.  Should have path and chown methods.
+        system.  Should have path, open and fchmod methods.
         :param open open_strategy: The callable used to open files for writing.
         :param boto3 aws_library: The module used to create AWS sessions and
         clients.
@@ -349,7 +496,26 @@ class CreateInstanceScript(object):
         self._open_strategy = open_strategy
         self._aws_library = aws_library
 
-    def _parse_arguments(self):
+    @staticmethod
+    def _parse_positive_integer(value):
+        error_message = "{value} is not a positive integer.".format(value=value)
+
+        try:
+            integer_value = int(value)
+
+        except ValueError:
+            raise argparse.ArgumentTypeError(error_message)
+
+        if integer_value < 1:
+            raise argparse.ArgumentTypeError(error_message)
+
+        return integer_value
+
+    @staticmethod
+    @functools.lru_cache(maxsize=1)
+    def _get_argument_parser():
+        # The parser only depends on constants, so it is built on first use and
+        # shared by every later run.
         argument_parser = argparse.ArgumentParser(
             description="Script to create an AWS EC2 instance."
         )
@@ -378,10 +544,23 @@ class CreateInstanceScript(object):
             help="Name of the image."
         )
 
-        argument_parser.add_argument(
+        # A prebaked image installs nothing on boot, so asking for packages
+        # alongside it is an error rather than silently dropping them.
+        package_group = argument_parser.add_mutually_exclusive_group()
+
+        package_group.add_argument(
+            "-b",
+            "--prebaked",
+            action='store_true',
+            default=False,
+            help=("Flags that the image already contains the packages, so "
+                  "nothing is installed with cloud-init on boot.")
+        )
+
+        package_group.add_argument(
             "-p",
             "--packages",
-            type=list,
+            type=str,
             nargs='+',
             default=[
                 "httpd",
@@ -401,6 +580,14 @@ class CreateInstanceScript(object):
             help="EC2 instance type to be created."
         )
 
+        argument_parser.add_argument(
+            '-c',
+            '--count',
+            type=CreateInstanceScript._parse_positive_integer,
+            default=1,
+            help="Number of identical instances to be created."
+        )
+
         argument_parser.add_argument(
             '-r',
             '--region-name',
@@ -416,29 +603,45 @@ class CreateInstanceScript(object):
             help="Subnet to create the instance in."
         )
 
-        parsed_arguments = argument_parser.parse_args(args=self._args)
+        return argument_parser
+
+    def _parse_arguments(self):
+        argument_parser = self._get_argument_parser()
+        namespace = argument_parser.parse_args(args=self._args)
+        parsed_arguments = ScriptArguments(**vars(namespace))
 
         return parsed_arguments
 
-    def _execute_creation_and_communicate(self, ec2_instance, key_pair):
-        ec2_instance.specify_key_pair(key_pair=key_pair)
+    def _prepare_key_and_image(self, key_pair, image):
+        # Creating the key and looking up the image are independent calls, so
+        # run them side by side rather than one after the other.
+        with futures.ThreadPoolExecutor(max_workers=2) as executor:
+            key_future = executor.submit(key_pair.create_in_all_locations)
+            image_future = executor.submit(image.resolve_image_id)
 
         try:
-            key_pair.create_in_all_locations()
-        except KeyExistsError as key_error:
+            key_future.result()
+        except (KeyExistsError, KeyNameInvalidError) as key_error:
             error_message = str(key_error)
             self._exit_with_error(message=error_message)
 
         try:
-            instance_id = ec2_instance.create_instance()
-            success_template = "{instance_id} created successfully."
-            success_message = success_template.format(instance_id=instance_id)
-            print(success_message)
-
+            image_future.result()
         except ImageMissingError as image_missing_error:
             error_message = str(image_missing_error)
             self._exit_with_error(message=error_message)
 
+    def _execute_creation_and_communicate(self, ec2_instance, key_pair, image):
+        ec2_instance.specify_key_pair(key_pair=key_pair)
+        self._prepare_key_and_image(key_pair=key_pair, image=image)
+
+        instance_ids = ec2_instance.create_instances()
+        success_template = "{instance_ids} created successfully."
+        success_message = success_template.format(
+            instance_ids=", ".join(instance_ids)
+        )
+        print(success_message)
+
     # noinspection PyUnresolvedReferences
     def _create_key_and_instance(self, parsed_arguments, client):
         key_pair = KeyPair(
@@ -461,13 +664,17 @@ class CreateInstanceScript(object):
         )
 
         ec2_instance.specify_subnet_id(subnet_id=parsed_arguments.subnet_id)
-        ec2_instance.specify_packages_to_install(
-            packages=parsed_arguments.packages
-        )
+        ec2_instance.specify_instance_count(count=parsed_arguments.count)
+
+        if not parsed_arguments.prebaked:
+            ec2_instance.specify_packages_to_install(
+                packages=parsed_arguments.packages
+            )
 
         self._execute_creation_and_communicate(
             ec2_instance=ec2_instance,
-            key_pair=key_pair
+            key_pair=key_pair,
+            image=image
         )
 
     def _exit_with_error_and_config(self, message):
@@ -496,12 +703,38 @@ class CreateInstanceScript(object):
 
         return session
 
+    @staticmethod
+    def _assemble_client_config():
+        from botocore import config
+
+        # A single client issues every call in a run, including the waiter's
+        # polls, so keep its connections alive and let botocore pace retries.
+        client_config = config.Config(
+            max_pool_connections=50,
+            tcp_keepalive=True,
+            retries={'max_attempts': 5, 'mode': 'adaptive'}
+        )
+
+        return client_config
+
     # noinspection PyUnresolvedReferences
     def _create_client(self, parsed_arguments):
+        from botocore import exceptions
+
+        client_key = (self._aws_library, parsed_arguments.region_name, 'ec2')
+        cached_client = self._CLIENT_CACHE.get(client_key)
+
+        if cached_client is not None:
+            return cached_client
+
         session = self._create_session(parsed_arguments=parsed_arguments)
 
         try:
-            client = session.client('ec2')
+            client = session.client(
+                'ec2',
+                config=self._assemble_client_config()
+            )
+            self._CLIENT_CACHE[client_key] = client
 
             return client
 
@@ -526,6 +759,10 @@ class CreateInstanceScript(object):
 
 
 if __name__ == '__main__':
+    # boto3 is only imported when run as a script, so importing the module on
+    # its own, as the tests do, does not pay for loading it.
+    import boto3
+
     script = CreateInstanceScript(
         args=sys.argv[1:],
         exit_strategy=exit,
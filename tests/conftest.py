@@ -0,0 +1,20 @@
+import pytest
+
+
+def pytest_configure(config):
+    config.addinivalue_line(
+        'markers',
+        'xdist_group(name): run the test on the same xdist worker as its group.'
+    )
+
+
+def pytest_collection_modifyitems(items):
+    """
+    Group every test with the rest of its module.  When run with
+    ``-n auto --dist loadgroup`` pytest-xdist then keeps a module on a single
+    worker, so module-scoped fixtures such as the moto backend are set up once
+    per module rather than once per worker.
+    """
+
+    for item in items:
+        item.add_marker(pytest.mark.xdist_group(name=item.module.__name__))
@@ -1,3 +1,5 @@
+from unittest import mock
+
 import pytest
 
 import boto3
@@ -9,10 +11,7 @@ import moto
 def mock_client():
     with moto.mock_ec2():
         client = boto3.client('ec2', region_name='us-east-1')
-        response = client.run_instances(ImageId='', MinCount=1, MaxCount=1)
-        instance_id = response['Instances'][0]['InstanceId']
-        client.create_image(InstanceId=instance_id, Name='jobcase-test-app')
-        client.terminate_instances(InstanceIds=[instance_id])
+        client.register_image(Name='jobcase-test-app')
 
         yield client
 
@@ -30,6 +29,27 @@ def test_add_image_id_to_specification(mock_client):
     assert specification['ImageId']
 
 
+def test_image_id_looked_up_once(mock_client):
+    ami = create_instance.AmazonMachineImage(
+        client=mock_client,
+        name='jobcase-test-app',
+        is_public=False
+    )
+
+    with mock.patch.object(
+            mock_client,
+            'get_paginator',
+            wraps=mock_client.get_paginator
+    ) as get_paginator_spy:
+        first_specification = {}
+        ami.add_image_id_to_specification(specification=first_specification)
+        second_specification = {}
+        ami.add_image_id_to_specification(specification=second_specification)
+
+    assert first_specification['ImageId'] == second_specification['ImageId']
+    assert get_paginator_spy.call_count == 1
+
+
 def test_cannot_find_public_image(mock_client):
     ami = create_instance.AmazonMachineImage(
         client=mock_client,
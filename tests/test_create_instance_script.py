@@ -1,3 +1,4 @@
+import functools
 import os
 from unittest import mock
 
@@ -12,10 +13,7 @@ import moto
 def mock_client():
     with moto.mock_ec2():
         client = boto3.client('ec2', region_name='us-east-1')
-        response = client.run_instances(ImageId='', MinCount=1, MaxCount=1)
-        instance_id = response['Instances'][0]['InstanceId']
-        client.create_image(InstanceId=instance_id, Name='jobcase-test-app')
-        client.terminate_instances(InstanceIds=[instance_id])
+        client.register_image(Name='jobcase-test-app')
 
         yield client
 
@@ -36,7 +34,7 @@ def mock_subnet_id(mock_client):
 
 @pytest.fixture
 def mock_boto3_library(mock_client):
-    return boto3
+    return mock.Mock(wraps=boto3)
 
 
 @pytest.fixture
@@ -46,12 +44,14 @@ def mock_open_strategy():
     return strategy
 
 
-@pytest.fixture
-def mock_operating_system():
+@functools.lru_cache(maxsize=1)
+def build_operating_system():
     operating_system = mock.Mock(spec_set=os)
     mock_path = mock.Mock(spec_set=os.path)
     operating_system.path = mock_path
     mock_path.sep = "/"
+    mock_path.altsep = None
+    mock_path.join.side_effect = lambda *parts: "/".join(parts)
     mock_path.expanduser.side_effect = lambda x: x.replace(
         "~",
         '/Users/tester'
@@ -60,6 +60,14 @@ def mock_operating_system():
     return operating_system
 
 
+@pytest.fixture
+def mock_operating_system():
+    operating_system = build_operating_system()
+    operating_system.reset_mock()
+
+    return operating_system
+
+
 @pytest.fixture
 def mock_image(mock_client):
     image = create_instance.AmazonMachineImage(
@@ -145,6 +153,48 @@ def test_region_arg(
     script.run()
 
 
+@pytest.mark.usefixtures(env_with_region.__name__)
+def test_key_exists(
+        mock_operating_system,
+        mock_open_strategy,
+        mock_boto3_library
+):
+
+    mock_boto3_library.client('ec2').create_key_pair(KeyName='aws-key')
+
+    script = create_instance.CreateInstanceScript(
+        args=['aws-key'],
+        exit_strategy=exit,
+        operating_system=mock_operating_system,
+        open_strategy=mock_open_strategy,
+        aws_library=mock_boto3_library
+    )
+
+    with pytest.raises(SystemExit):
+        script.run()
+
+
+@pytest.mark.usefixtures(env_with_region.__name__)
+def test_key_name_with_separator(
+        mock_operating_system,
+        mock_open_strategy,
+        mock_boto3_library
+):
+
+    script = create_instance.CreateInstanceScript(
+        args=['/tmp/evil'],
+        exit_strategy=exit,
+        operating_system=mock_operating_system,
+        open_strategy=mock_open_strategy,
+        aws_library=mock_boto3_library
+    )
+
+    with pytest.raises(SystemExit):
+        script.run()
+
+    mock_open_strategy.assert_not_called()
+
+
 @pytest.mark.usefixtures(env_with_region.__name__)
 def test_public_image_missing(
         mock_operating_system,
@@ -190,6 +240,8 @@ def test_new_packages(
         mock_boto3_library
 ):
 
+    builder_class = create_instance.InstanceBuilder
+
     script = create_instance.CreateInstanceScript(
         args=['aws-key', '--packages', 'ansible', 'postgres', 'nginx'],
         exit_strategy=exit,
@@ -198,7 +250,64 @@ def test_new_packages(
         aws_library=mock_boto3_library
     )
 
-    script.run()
+    with mock.patch.object(
+            builder_class,
+            'specify_packages_to_install',
+            autospec=True,
+            side_effect=builder_class.specify_packages_to_install
+    ) as specify_packages_spy:
+        script.run()
+
+    packages = specify_packages_spy.call_args[1]['packages']
+
+    assert packages == ['ansible', 'postgres', 'nginx']
+
+
+@pytest.mark.usefixtures(env_with_region.__name__)
+def test_prebaked_image(
+        mock_operating_system,
+        mock_open_strategy,
+        mock_boto3_library
+):
+
+    builder_class = create_instance.InstanceBuilder
+
+    script = create_instance.CreateInstanceScript(
+        args=['aws-key', '--prebaked'],
+        exit_strategy=exit,
+        operating_system=mock_operating_system,
+        open_strategy=mock_open_strategy,
+        aws_library=mock_boto3_library
+    )
+
+    with mock.patch.object(
+            builder_class,
+            'specify_packages_to_install',
+            autospec=True,
+            side_effect=builder_class.specify_packages_to_install
+    ) as specify_packages_spy:
+        script.run()
+
+    specify_packages_spy.assert_not_called()
+
+
+@pytest.mark.usefixtures(env_with_region.__name__)
+def test_prebaked_image_with_packages(
+        mock_operating_system,
+        mock_open_strategy,
+        mock_boto3_library
+):
+
+    with pytest.raises(SystemExit):
+        script = create_instance.CreateInstanceScript(
+            args=['aws-key', '--prebaked', '--packages', 'nginx'],
+            exit_strategy=exit,
+            operating_system=mock_operating_system,
+            open_strategy=mock_open_strategy,
+            aws_library=mock_boto3_library
+        )
+
+        script.run()
 
 
 @pytest.mark.usefixtures(env_with_region.__name__)
@@ -219,6 +328,51 @@ def test_new_instance_type(
     script.run()
 
 
+@pytest.mark.usefixtures(env_with_region.__name__)
+def test_instance_count(
+        mock_operating_system,
+        mock_open_strategy,
+        mock_boto3_library,
+        capsys
+):
+
+    script = create_instance.CreateInstanceScript(
+        args=['aws-key', '--count', '2'],
+        exit_strategy=exit,
+        operating_system=mock_operating_system,
+        open_strategy=mock_open_strategy,
+        aws_library=mock_boto3_library
+    )
+
+    script.run()
+
+    output = capsys.readouterr().out
+    instance_ids = output.replace(" created successfully.", "").strip()
+
+    assert len(set(instance_ids.split(", "))) == 2
+
+
+@pytest.mark.parametrize("count", ['0', '-1', 'abc'])
+@pytest.mark.usefixtures(env_with_region.__name__)
+def test_instance_count_not_positive(
+        mock_operating_system,
+        mock_open_strategy,
+        mock_boto3_library,
+        count
+):
+
+    with pytest.raises(SystemExit):
+        script = create_instance.CreateInstanceScript(
+            args=['aws-key', '--count', count],
+            exit_strategy=exit,
+            operating_system=mock_operating_system,
+            open_strategy=mock_open_strategy,
+            aws_library=mock_boto3_library
+        )
+
+        script.run()
+
+
 @pytest.mark.usefixtures(env_with_region.__name__)
 def test_subnet_id(
         mock_operating_system,
@@ -236,3 +390,24 @@ def test_subnet_id(
     )
 
     script.run()
+
+
+@pytest.mark.usefixtures(env_with_region.__name__)
+def test_client_reused_across_runs(
+        mock_operating_system,
+        mock_open_strategy,
+        mock_boto3_library
+):
+
+    for key_name in ['aws-key', 'another-aws-key']:
+        script = create_instance.CreateInstanceScript(
+            args=[key_name],
+            exit_strategy=exit,
+            operating_system=mock_operating_system,
+            open_strategy=mock_open_strategy,
+            aws_library=mock_boto3_library
+        )
+
+        script.run()
+
+    assert mock_boto3_library.session.Session.call_count == 1
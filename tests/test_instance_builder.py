@@ -1,3 +1,4 @@
+import functools
 import os
 from unittest import mock
 
@@ -12,10 +13,7 @@ import moto
 def mock_client():
     with moto.mock_ec2():
         client = boto3.client('ec2', region_name='us-east-1')
-        response = client.run_instances(ImageId='', MinCount=1, MaxCount=1)
-        instance_id = response['Instances'][0]['InstanceId']
-        client.create_image(InstanceId=instance_id, Name='jobcase-test-app')
-        client.terminate_instances(InstanceIds=[instance_id])
+        client.register_image(Name='jobcase-test-app')
 
         yield client
 
@@ -27,12 +25,14 @@ def mock_open_strategy():
     return strategy
 
 
-@pytest.fixture
-def mock_operating_system():
+@functools.lru_cache(maxsize=1)
+def build_operating_system():
     operating_system = mock.Mock(spec_set=os)
     mock_path = mock.Mock(spec_set=os.path)
     operating_system.path = mock_path
     mock_path.sep = "/"
+    mock_path.altsep = None
+    mock_path.join.side_effect = lambda *parts: "/".join(parts)
     mock_path.expanduser.side_effect = lambda x: x.replace(
         "~",
         '/Users/tester'
@@ -41,6 +41,14 @@ def mock_operating_system():
     return operating_system
 
 
+@pytest.fixture
+def mock_operating_system():
+    operating_system = build_operating_system()
+    operating_system.reset_mock()
+
+    return operating_system
+
+
 @pytest.fixture
 def mock_image(mock_client):
     image = create_instance.AmazonMachineImage(
@@ -52,6 +60,16 @@ def mock_image(mock_client):
     return image
 
 
+@pytest.fixture
+def run_instances_spy(mock_client):
+    with mock.patch.object(
+            mock_client,
+            'run_instances',
+            wraps=mock_client.run_instances
+    ) as spy:
+        yield spy
+
+
 @pytest.fixture
 def mock_key_pair(mock_client, mock_operating_system, mock_open_strategy):
     key_pair = create_instance.KeyPair(
@@ -102,3 +120,104 @@ def test_specify_create_instance(mock_client, mock_image, mock_key_pair):
     response = mock_client.describe_instances(InstanceIds=[instance_id])
 
     assert len(response['Reservations'][0]['Instances']) == 1
+
+
+def test_create_instances_count(mock_client, mock_image):
+    builder = create_instance.InstanceBuilder(
+        client=mock_client,
+        machine_image=mock_image,
+        instance_type='t2.micro'
+    )
+
+    builder.specify_instance_count(count=3)
+    instance_ids = builder.create_instances()
+    response = mock_client.describe_instances(InstanceIds=instance_ids)
+
+    assert len(instance_ids) == 3
+    assert len(response['Reservations'][0]['Instances']) == 3
+
+
+def test_create_instance_keeps_count(mock_client, mock_image):
+    builder = create_instance.InstanceBuilder(
+        client=mock_client,
+        machine_image=mock_image,
+        instance_type='t2.micro'
+    )
+
+    builder.specify_instance_count(count=3)
+    instance_id = builder.create_instance()
+    instance_ids = builder.create_instances()
+
+    assert instance_id not in instance_ids
+    assert len(instance_ids) == 3
+
+
+def test_create_instances_new_client_token_per_call(
+        mock_client,
+        mock_image,
+        run_instances_spy
+):
+    builder = create_instance.InstanceBuilder(
+        client=mock_client,
+        machine_image=mock_image,
+        instance_type='t2.micro'
+    )
+
+    builder.create_instances()
+    builder.create_instances()
+
+    first_call, second_call = run_instances_spy.call_args_list
+
+    assert first_call[1]['ClientToken']
+    assert second_call[1]['ClientToken']
+    assert first_call[1]['ClientToken'] != second_call[1]['ClientToken']
+
+
+def test_create_instances_user_data(
+        mock_client,
+        mock_image,
+        run_instances_spy
+):
+    builder = create_instance.InstanceBuilder(
+        client=mock_client,
+        machine_image=mock_image,
+        instance_type='t2.micro'
+    )
+
+    builder.specify_packages_to_install(["httpd", "mysql"])
+    builder.create_instances()
+
+    user_data = run_instances_spy.call_args[1]['UserData']
+
+    assert user_data == "#cloud-config\n\npackages:\n - httpd\n - mysql"
+
+
+def test_create_instances_no_packages_no_user_data(
+        mock_client,
+        mock_image,
+        run_instances_spy
+):
+    builder = create_instance.InstanceBuilder(
+        client=mock_client,
+        machine_image=mock_image,
+        instance_type='t2.micro'
+    )
+
+    builder.create_instances()
+
+    assert 'UserData' not in run_instances_spy.call_args[1]
+
+
+def test_create_instances_tags(mock_client, mock_image):
+    builder = create_instance.InstanceBuilder(
+        client=mock_client,
+        machine_image=mock_image,
+        instance_type='t2.micro'
+    )
+
+    instance_ids = builder.create_instances()
+    response = mock_client.describe_instances(InstanceIds=instance_ids)
+    instance = response['Reservations'][0]['Instances'][0]
+    tags = {tag['Key']: tag['Value'] for tag in instance['Tags']}
+
+    assert tags == {'Project': 'Jobcase-Test-Lab', 'Environment': 'Development'}
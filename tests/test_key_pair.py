@@ -1,4 +1,5 @@
 import os
+from types import SimpleNamespace
 from unittest import mock
 
 import pytest
@@ -7,46 +8,66 @@ import boto3
 import create_instance
 import moto
 
+SSH_DIRECTORY_PATH = '/Users/tester/.ssh'
+LOCAL_KEY_PATH = SSH_DIRECTORY_PATH + '/aws-key.pem'
 
-@pytest.fixture
+
+@pytest.fixture(scope='module', autouse=True)
+def moto_ec2():
+    mock_ec2 = moto.mock_ec2()
+    mock_ec2.start()
+
+    yield
+
+    mock_ec2.stop()
+
+
+@pytest.fixture(scope='module')
 def mock_client():
-    with moto.mock_ec2():
-        client = boto3.client('ec2', region_name='us-east-1')
-        response = client.run_instances(ImageId='', MinCount=1, MaxCount=1)
-        instance_id = response['Instances'][0]['InstanceId']
-        client.create_image(InstanceId=instance_id, Name='jobcase-test-app')
-        client.terminate_instances(InstanceIds=[instance_id])
+    client = boto3.client('ec2', region_name='us-east-1')
+
+    return client
 
-        yield client
 
+@pytest.fixture(scope='module')
+def create_key_pair_spy(mock_client):
+    with mock.patch.object(
+            mock_client,
+            'create_key_pair',
+            wraps=mock_client.create_key_pair
+    ) as spy:
+        yield spy
 
-@pytest.fixture
+
+@pytest.fixture(scope='session')
 def mock_open_strategy():
-    strategy = mock.mock_open()
+    strategy = mock.MagicMock()
+    key_file = strategy.return_value
+    key_file.__enter__.return_value = key_file
+    key_file.__exit__.return_value = False
 
     return strategy
 
 
-@pytest.fixture
+@pytest.fixture(scope='session')
 def mock_operating_system():
-    operating_system = mock.Mock(spec_set=os)
-    mock_path = mock.Mock(spec_set=os.path)
-    operating_system.path = mock_path
-    mock_path.sep = "/"
-    mock_path.expanduser.side_effect = lambda x: x.replace(
-        "~",
-        '/Users/tester'
+    mock_path = SimpleNamespace(
+        sep="/",
+        altsep=None,
+        join=lambda *parts: "/".join(parts),
+        expanduser=lambda path: SSH_DIRECTORY_PATH
+    )
+    operating_system = SimpleNamespace(
+        open=mock.Mock(),
+        fchmod=mock.Mock(),
+        path=mock_path
     )
 
     return operating_system
 
 
-def test_add_key_pair_to_specification(
-        mock_client,
-        mock_operating_system,
-        mock_open_strategy
-):
-
+@pytest.fixture(scope='module')
+def key_pair(mock_client, mock_operating_system, mock_open_strategy):
     key_pair = create_instance.KeyPair(
         key_name='aws-key',
         client=mock_client,
@@ -54,64 +75,150 @@ def test_add_key_pair_to_specification(
         open_strategy=mock_open_strategy
     )
 
+    return key_pair
+
+
+@pytest.fixture(scope='module')
+def key_pair_creation(
+        key_pair,
+        create_key_pair_spy,
+        mock_open_strategy,
+        mock_operating_system
+):
+
+    create_key_pair_spy.reset_mock()
+    mock_open_strategy.reset_mock()
+    key_pair.create_in_all_locations()
+
+    # The shared mocks are reset before every test, so keep the calls made by
+    # this one creation for the assertions that inspect it.
+    creation = SimpleNamespace(
+        create_key_pair_calls=list(create_key_pair_spy.call_args_list),
+        open_strategy_calls=list(mock_open_strategy.call_args_list),
+        operating_system=mock_operating_system
+    )
+
+    return creation
+
+
+@pytest.fixture(autouse=True)
+def reset_shared_mocks(
+        create_key_pair_spy,
+        mock_open_strategy,
+        mock_operating_system
+):
+
+    create_key_pair_spy.reset_mock()
+    mock_open_strategy.reset_mock()
+    mock_operating_system.open.reset_mock()
+    mock_operating_system.fchmod.reset_mock()
+
+
+def assert_key_name_in_specification(key_pair):
     specification = {}
     key_pair.add_key_name_to_specification(specification=specification)
 
-    assert specification['KeyName']
+    assert specification['KeyName'] == 'aws-key'
 
 
-def test_create_in_all_client(
-        mock_client,
-        mock_operating_system,
-        mock_open_strategy
-):
+def assert_key_pair_sent_to_aws(creation):
+    assert creation.create_key_pair_calls == [mock.call(KeyName='aws-key')]
 
-    key_pair = create_instance.KeyPair(
-        key_name='aws-key',
-        client=mock_client,
-        operating_system=mock_operating_system,
-        open_strategy=mock_open_strategy
-    )
 
-    key_pair.create_in_all_locations()
-    key_description = mock_client.describe_key_pairs(KeyNames=['aws-key'])
+def assert_key_file_opened(creation):
+    expected_call = mock.call(
+        LOCAL_KEY_PATH,
+        mode='wb',
+        buffering=8192,
+        opener=mock.ANY
+    )
 
-    assert len(key_description['KeyPairs']) == 1
+    assert creation.open_strategy_calls == [expected_call]
 
 
-def test_create_in_all_file(
-        mock_client,
-        mock_operating_system,
-        mock_open_strategy
-):
+def assert_opener_restricts_mode(creation):
+    # The mocked open strategy never runs the opener, so it is called here
+    # directly.  test_create_in_all_existing_file_made_private covers the
+    # file that create_in_all_locations actually writes.
+    [open_call] = creation.open_strategy_calls
+    opener = open_call[1]['opener']
+    opener(LOCAL_KEY_PATH, os.O_WRONLY)
 
-    key_pair = create_instance.KeyPair(
-        key_name='aws-key',
-        client=mock_client,
-        operating_system=mock_operating_system,
-        open_strategy=mock_open_strategy
+    creation.operating_system.open.assert_called_once_with(
+        LOCAL_KEY_PATH,
+        os.O_WRONLY,
+        0o600
+    )
+    creation.operating_system.fchmod.assert_called_once_with(
+        creation.operating_system.open.return_value,
+        0o600
     )
 
-    key_pair.create_in_all_locations()
-    local_key_path = '/Users/tester/.ssh/aws-key.pem'
 
-    mock_open_strategy.assert_called_once_with(local_key_path, mode='w')
+@pytest.mark.parametrize(
+    'fixture_name, assertion',
+    [
+        (key_pair.__name__, assert_key_name_in_specification),
+        (key_pair_creation.__name__, assert_key_pair_sent_to_aws),
+        (key_pair_creation.__name__, assert_key_file_opened),
+        (key_pair_creation.__name__, assert_opener_restricts_mode)
+    ]
+)
+def test_key_pair(request, fixture_name, assertion):
+    assertion(request.getfixturevalue(fixture_name))
 
 
-def test_create_in_all_file_chmod(
+@pytest.mark.usefixtures(key_pair_creation.__name__)
+def test_create_in_all_key_exists(key_pair):
+    with pytest.raises(create_instance.KeyExistsError):
+        key_pair.create_in_all_locations()
+
+
+@pytest.mark.parametrize('key_name', ['/tmp/evil', 'nested/aws-key'])
+def test_create_in_all_key_name_with_separator(
         mock_client,
         mock_operating_system,
-        mock_open_strategy
+        mock_open_strategy,
+        create_key_pair_spy,
+        key_name
 ):
-
     key_pair = create_instance.KeyPair(
-        key_name='aws-key',
+        key_name=key_name,
         client=mock_client,
         operating_system=mock_operating_system,
         open_strategy=mock_open_strategy
     )
 
+    with pytest.raises(create_instance.KeyNameInvalidError):
+        key_pair.create_in_all_locations()
+
+    create_key_pair_spy.assert_not_called()
+    mock_open_strategy.assert_not_called()
+
+
+def test_create_in_all_existing_file_made_private(mock_client, tmp_path):
+    local_key_path = tmp_path / 'loose-key.pem'
+    local_key_path.write_text('stale key material')
+    local_key_path.chmod(0o644)
+    operating_system = SimpleNamespace(
+        open=os.open,
+        fchmod=os.fchmod,
+        path=SimpleNamespace(
+            sep=os.path.sep,
+            altsep=os.path.altsep,
+            join=os.path.join,
+            expanduser=lambda path: str(tmp_path)
+        )
+    )
+
+    key_pair = create_instance.KeyPair(
+        key_name='loose-key',
+        client=mock_client,
+        operating_system=operating_system,
+        open_strategy=open
+    )
+
     key_pair.create_in_all_locations()
-    local_key_path = '/Users/tester/.ssh/aws-key.pem'
 
-    mock_operating_system.chmod.assert_called_once_with(local_key_path, 0o600)
+    assert local_key_path.stat().st_mode & 0o777 == 0o600
+    assert local_key_path.read_text() != 'stale key material'